@@ -55,16 +55,19 @@ def benchmark(model_path, provider, iterations=50, warmups=5):
         if np_type == np.int64:
             input_feed[input_name] = np.ones(processed_shape).astype(np_type)
     
+    # Resolve output names once instead of on every run
+    output_names = [out.name for out in session.get_outputs()]
+
     # Warmup
     print(f"Warming up for {warmups} iterations...")
     for _ in range(warmups):
-        session.run(None, input_feed)
+        session.run(output_names, input_feed)
         
     # Benchmark
     print(f"Running benchmark for {iterations} iterations...")
     start_time = time.perf_counter()
     for _ in range(iterations):
-        session.run(None, input_feed)
+        session.run(output_names, input_feed)
     end_time = time.perf_counter()
     
     total_time = end_time - start_time
@@ -133,13 +136,16 @@ def benchmark(model_path, provider, iterations=50, warmups=5, session=None):
         if np_type == np.int64:
             input_feed[input_name] = np.ones(processed_shape).astype(np_type)
     
+    # Resolve output names once instead of on every run
+    output_names = [out.name for out in session.get_outputs()]
+
     # Warmup
     for _ in range(warmups):
-        session.run(None, input_feed)
+        session.run(output_names, input_feed)
         
     start_time = time.perf_counter()
     for _ in range(iterations):
-        session.run(None, input_feed)
+        session.run(output_names, input_feed)
     end_time = time.perf_counter()
     
     total_time = end_time - start_time
@@ -1,25 +1,75 @@
+import argparse
 import concurrent.futures
+from functools import partial
+from pathlib import Path
 from time import perf_counter
 
 import numpy as np
 import onnxruntime as ort
 
+rng = np.random.default_rng()
 
-def create_session(model_path):
+TRT_CACHE_DIR = Path("./trt_cache")
+
+ONNX_TO_NUMPY_TYPE = {
+    "tensor(float16)": np.float16,
+    "tensor(float)": np.float32,
+}
+
+
+def create_session(
+    model_path, provider="trt", enable_cuda_graph=False, disable_mem_arena=False
+):
     # Create session options
     session_options = ort.SessionOptions()
     session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if disable_mem_arena:
+        # Many small inferences only bloat RSS with the arena, no throughput gain
+        session_options.enable_cpu_mem_arena = False
+        session_options.enable_mem_pattern = False
 
     # session_options.enable_profiling = True
 
-    # Use CoreMLExecutionProvider with settings for ANE only
-    # providers = ["CPUExecutionProvider"]
-    # providers = [
-    #     ("CoreMLExecutionProvider", {"use_ane": True}),
-    #     "CPUExecutionProvider",
-    # ]
-
-    providers = ["CUDAExecutionProvider"]
+    if provider == "coreml":
+        # MLProgram covers more ops on the ANE than the legacy NeuralNetwork
+        # format, pinning CPU+ANE avoids ping-ponging through the GPU
+        coreml_options = {
+            "ModelFormat": "MLProgram",
+            "MLComputeUnits": "CPUAndNeuralEngine",
+            # Exported models have a fixed batch, see yolo_to_onnx.py
+            "RequireStaticInputShapes": "1",
+            "EnableOnSubgraphs": "1",
+        }
+        providers = [("CoreMLExecutionProvider", coreml_options)]
+    elif provider == "cpu":
+        providers = ["CPUExecutionProvider"]
+    else:
+        cuda_options = {
+            # EXHAUSTIVE autotunes every conv on first run and grabs a large workspace
+            "cudnn_conv_algo_search": "DEFAULT",
+            "cudnn_conv_use_max_workspace": "0",
+            "do_copy_in_default_stream": "1",
+        }
+        if provider == "trt":
+            trt_options = {
+                "trt_fp16_enable": "1",
+                # One cache dir per model file (hence per batch size) so engines are
+                # built once and not rebuilt when switching between batch models
+                "trt_engine_cache_enable": "1",
+                "trt_engine_cache_path": str(TRT_CACHE_DIR / Path(model_path).stem),
+                "trt_max_workspace_size": str(4 << 30),
+                # Graph replay needs fixed shapes, only enable it for fixed-batch models
+                "trt_cuda_graph_enable": "1" if enable_cuda_graph else "0",
+            }
+            # CUDA EP only runs the nodes TensorRT can't take
+            providers = [
+                ("TensorrtExecutionProvider", trt_options),
+                ("CUDAExecutionProvider", cuda_options),
+            ]
+        else:
+            # CUDA graphs replay captured kernels, only use them for fixed-shape models
+            cuda_options["enable_cuda_graph"] = "1" if enable_cuda_graph else "0"
+            providers = [("CUDAExecutionProvider", cuda_options)]
 
     session = ort.InferenceSession(
         model_path, sess_options=session_options, providers=providers
@@ -27,43 +77,197 @@ def create_session(model_path):
     return session
 
 
-def run_inference(session, input_tensor):
-    # Get model input name
-    input_name = session.get_inputs()[0].name
-    # Run inference
-    output = session.run(None, {input_name: input_tensor})
-    return output
+def model_batch_size(model_path):
+    # Read the batch axis on a CPU session, building the real ones (e.g. a
+    # TensorRT engine) depends on the batch size. None for a dynamic axis.
+    probe = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    batch_size = probe.get_inputs()[0].shape[0]
+    return batch_size if isinstance(batch_size, int) else None
+
+
+def random_input(session, shape):
+    # Match the model input precision, FP16 models take half the bandwidth
+    dtype = ONNX_TO_NUMPY_TYPE[session.get_inputs()[0].type]
+    return rng.random(shape, dtype=np.float32).astype(dtype, copy=False)
+
+
+def create_io_binding(session, input_tensor, device="cuda"):
+    # Copy the input to the device once and bind it, so each run skips the H2D copy
+    input_ortvalue = ort.OrtValue.ortvalue_from_numpy(input_tensor, device, 0)
+    return bind_device_buffers(session, input_ortvalue, device)
+
+
+def bind_device_buffers(session, input_ortvalue, device="cuda"):
+    io_binding = session.io_binding()
+    io_binding.bind_ortvalue_input(session.get_inputs()[0].name, input_ortvalue)
+    # Outputs stay on the device until copy_outputs_to_cpu is called
+    for output in session.get_outputs():
+        if all(isinstance(dim, int) for dim in output.shape):
+            # Fixed output address, required to replay a captured CUDA graph
+            output_ortvalue = ort.OrtValue.ortvalue_from_shape_and_type(
+                output.shape, ONNX_TO_NUMPY_TYPE[output.type], device, 0
+            )
+            io_binding.bind_ortvalue_output(output.name, output_ortvalue)
+        else:
+            io_binding.bind_output(output.name, device)
+    return io_binding
+
+
+def create_double_buffer(session, input_tensor, device="cuda"):
+    # Two device input buffers, each with its own binding and output buffers
+    input_ortvalues = [
+        ort.OrtValue.ortvalue_from_numpy(input_tensor, device, 0) for _ in range(2)
+    ]
+    io_bindings = [
+        bind_device_buffers(session, input_ortvalue, device)
+        for input_ortvalue in input_ortvalues
+    ]
+    return io_bindings, input_ortvalues
+
+
+def create_shrinking_run_options():
+    # Release unused GPU arena chunks back to the device at the end of each run
+    run_options = ort.RunOptions()
+    run_options.add_run_config_entry("memory.enable_memory_arena_shrinkage", "gpu:0")
+    return run_options
+
+
+def run_inferences(session, io_binding, latencies, run_options=None):
+    # Bindings aren't thread safe, a worker thread loops on its own session.
+    # Look the bound method up once, the loop body is then a single call.
+    # latencies is preallocated (or a view of it), one run per slot.
+    run_with_iobinding = session.run_with_iobinding
+    for i in range(len(latencies)):
+        iteration_start = perf_counter()
+        run_with_iobinding(io_binding, run_options)
+        latencies[i] = perf_counter() - iteration_start
+
+
+def run_double_buffered(
+    session, double_buffer, latencies, run_options=None, *, host_batches
+):
+    # Upload a new host batch every iteration like real pages would be, but
+    # copy the next batch into the idle buffer while the session computes on
+    # the other one, so the H2D copy hides behind compute
+    io_bindings, input_ortvalues = double_buffer
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as uploader:
+        upload = uploader.submit(input_ortvalues[0].update_inplace, host_batches[0])
+        for i in range(len(latencies)):
+            iteration_start = perf_counter()
+            upload.result()
+            if i + 1 < len(latencies):
+                upload = uploader.submit(
+                    input_ortvalues[(i + 1) % 2].update_inplace,
+                    host_batches[(i + 1) % len(host_batches)],
+                )
+            session.run_with_iobinding(io_bindings[i % 2], run_options)
+            latencies[i] = perf_counter() - iteration_start
 
 
 if __name__ == "__main__":
-    ##### BATCH
-    onnx_model_path = "../models/yolov8s-doclaynet-batch-16.onnx"
-    batch_session = create_session(onnx_model_path)
+    parser = argparse.ArgumentParser(description="Benchmark a YOLO layout ONNX model")
+    parser.add_argument(
+        "--model",
+        default="../models/yolov8s-doclaynet-batch-16.onnx",
+        help="Path to the ONNX model",
+    )
+    parser.add_argument(
+        "--provider", choices=["trt", "cuda", "coreml", "cpu"], default="trt"
+    )
+    parser.add_argument(
+        "--batch",
+        type=int,
+        help="Batch size, defaults to the model's static batch size",
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=1, help="Number of timed inferences"
+    )
+    parser.add_argument(
+        "--sessions",
+        type=int,
+        default=1,
+        help="Sessions to spread the inferences over, one worker thread each",
+    )
+    parser.add_argument(
+        "--double-buffer",
+        action="store_true",
+        help="Upload a new input every run, overlapped with the previous run",
+    )
+    args = parser.parse_args()
+
+    model_batch = model_batch_size(args.model)
+    if model_batch is None and args.batch is None:
+        parser.error(f"{args.model} has a dynamic batch axis, pass --batch")
+    if model_batch is not None and args.batch not in (None, model_batch):
+        parser.error(
+            f"--batch {args.batch} doesn't match the batch size {model_batch} "
+            f"of {args.model}"
+        )
+    args.batch = args.batch or model_batch
+
+    on_gpu = args.provider in ("trt", "cuda")
+    device = "cuda" if on_gpu else "cpu"
+    # A CUDA session runs everything on its own stream, so concurrent runs on
+    # one session serialize. Give each worker thread its own session instead.
+    sessions = [
+        create_session(
+            args.model,
+            args.provider,
+            # Alternating input buffers break the fixed addresses graph replay needs
+            enable_cuda_graph=on_gpu and args.batch > 1 and not args.double_buffer,
+            disable_mem_arena=args.batch == 1,
+        )
+        for _ in range(args.sessions)
+    ]
+    run_options = create_shrinking_run_options() if on_gpu and args.batch == 1 else None
+
+    input_shape = (args.batch, 3, 1024, 1024)
+    if args.double_buffer:
+        host_batches = [random_input(sessions[0], input_shape) for _ in range(2)]
+        buffers = [
+            create_double_buffer(session, host_batches[0], device)
+            for session in sessions
+        ]
+        run = partial(run_double_buffered, host_batches=host_batches)
+    else:
+        input_tensor = random_input(sessions[0], input_shape)
+        buffers = [
+            create_io_binding(session, input_tensor, device) for session in sessions
+        ]
+        run = run_inferences
 
-    input_tensor = np.random.rand(16, 3, 1024, 1024).astype(np.float32)
+    # Keep two warm-up runs: the first is a regular run, ORT captures the CUDA
+    # graph on the second, so timed runs are all replays
+    for session, buffer in zip(sessions, buffers):
+        run(session, buffer, np.empty(2), run_options)
 
-    # _ = run_inference(batch_session, input_tensor)
+    latencies = np.empty(args.repeats)
     s = perf_counter()
-    for i in range(1):
-        outputs = run_inference(batch_session, input_tensor)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        # Split the inferences across sessions, each worker owns one session
+        futures = [
+            executor.submit(
+                run,
+                session,
+                buffer,
+                # Strided view, each worker writes its own slots in place
+                latencies[i :: args.sessions],
+                run_options,
+            )
+            for i, (session, buffer) in enumerate(zip(sessions, buffers))
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
     e = perf_counter()
-    print(f"Model {onnx_model_path} took: {e-s:.2f}s")
-
-    ##### SINGLE
-    # onnx_model_path = "../models/yolov8s-doclaynet.onnx"
-    # single_batch_session = create_session(onnx_model_path)
-    # input_tensor = np.random.rand(1, 3, 1024, 1024).astype(np.float32)
-    # # _ = run_inference(single_batch_session, input_tensor)
-    # batch_size = 16  # Total number of inferences to run
-    # s = perf_counter()
-    # with concurrent.futures.ThreadPoolExecutor() as executor:
-    #     futures = [
-    #         executor.submit(run_inference, single_batch_session, input_tensor)
-    #         for _ in range(batch_size)
-    #     ]
-    #     results = [
-    #         future.result() for future in concurrent.futures.as_completed(futures)
-    #     ]
-
-    # e = perf_counter()
-    # print(f"Model {onnx_model_path} took: {e-s:.2f}s")
+    io_binding = buffers[0][0][0] if args.double_buffer else buffers[0]
+    outputs = io_binding.copy_outputs_to_cpu()
+    print(f"Output shapes: {[output.shape for output in outputs]}")
+
+    print(
+        f"Model {args.model} ({args.provider}) took: {e-s:.2f}s "
+        f"for {args.repeats} x batch {args.batch}"
+    )
+    print(
+        f"Latency: mean {1e3 * latencies.mean():.2f}ms, "
+        f"p50 {1e3 * np.median(latencies):.2f}ms, max {1e3 * latencies.max():.2f}ms"
+    )
@@ -1,7 +1,15 @@
+from pathlib import Path
+
 import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
 from ultralytics import YOLO
 
-# Load the YOLO11 model
+BATCH_SIZES = [1, 2, 4, 8, 16, 32]
+
+# Static shapes everywhere so TensorRT and CoreML can fully optimize the graph
+EXPORT_ARGS = dict(format="onnx", imgsz=1024, dynamic=False, opset=17, simplify=True)
+
+# Load the YOLO11 model once, every export below reuses it
 
 model = YOLO("yolov10s-doclaynet.pt")
 
@@ -10,5 +18,29 @@ input = torch.randn(1, 3, 1024, 1024)
 model.eval()
 res = model(input)[0]
 
-# Export the model to ONNX format
-# model.export(format="onnx")
+for batch_size in BATCH_SIZES:
+    # Never leave a model at <model>.onnx, the next export writes that path
+    suffix = f"-batch-{batch_size}"
+
+    # FP16 export halves the input bandwidth and runs on tensor cores. Ultralytics
+    # only exports half precision on a CUDA device, skip it elsewhere (e.g. macOS)
+    if torch.cuda.is_available():
+        fp16_path = Path(
+            model.export(**EXPORT_ARGS, batch=batch_size, half=True, device=0)
+        )
+        fp16_path = fp16_path.rename(
+            fp16_path.with_name(f"{fp16_path.stem}{suffix}-fp16.onnx")
+        )
+        print(f"Exported {fp16_path}")
+
+    fp32_path = Path(model.export(**EXPORT_ARGS, batch=batch_size))
+    fp32_path = fp32_path.rename(fp32_path.with_name(f"{fp32_path.stem}{suffix}.onnx"))
+    print(f"Exported {fp32_path}")
+
+    # Ultralytics has no INT8 ONNX export, quantize the FP32 export instead.
+    # Dynamic quantization emits ConvInteger/DynamicQuantizeLinear, which the
+    # CUDA and TensorRT EPs don't implement: this variant is for the CPU and
+    # CoreML paths only, on GPU it would silently fall back to the CPU EP
+    int8_path = fp32_path.with_name(f"{fp32_path.stem}_int8.onnx")
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"Exported {int8_path}")
@@ -1,14 +1,14 @@
 #!/usr/bin/env python3
 
 import asyncio
+import csv
 from time import perf_counter
 import aiohttp
 import os
 from pathlib import Path
 import logging
-import json
-import glob
-import statistics
+import numpy as np
+import orjson
 
 import argparse
 from asyncio.locks import Semaphore
@@ -17,6 +17,9 @@ import shutil
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+RESULTS_CSV = "results.csv"
+RESULTS_FIELDS = ["filename", "success", "pages", "blocks", "parsing_duration_ms"]
+
 
 def analyze_parsing_results(
     processing_time_s: float,
@@ -32,50 +35,49 @@ def analyze_parsing_results(
         "blocks_per_page": [],
     }
 
-    # Process all JSON files
-    for json_file in glob.glob(f"{results_dir}/*.pdf.json"):
-        with open(json_file) as f:
-            try:
-                response = json.load(f)
-                if not response.get("success"):
-                    continue
-
-                doc = response["data"]
-
-                # Get basic counts
-                n_pages = len(doc["pages"])
-                n_blocks = len(doc["blocks"])
-                parsing_duration_ms = doc["metadata"]["parsing_duration"]
-
-                # Update statistics
-                stats["total_documents"] += 1
-                stats["total_pages"] += n_pages
-                stats["total_blocks"] += n_blocks
-                stats["parsing_durations_ms"].append(parsing_duration_ms)
-                stats["blocks_per_doc"].append(n_blocks)
-                stats["pages_per_doc"].append(n_pages)
-                stats["blocks_per_page"].append(
-                    n_blocks / n_pages if n_pages > 0 else 0
-                )
-
-            except Exception as e:
-                print(f"Error processing {json_file}: {e}")
-                continue
+    # Process the per-file summaries, a missing file means nothing was parsed
+    results_csv = Path(results_dir) / RESULTS_CSV
+    rows = []
+    if results_csv.exists():
+        with open(results_csv, newline="") as f:
+            rows = list(csv.DictReader(f))
+
+    for row in rows:
+        if row["success"] != "True":
+            continue
+
+        # Get basic counts
+        n_pages = int(row["pages"])
+        n_blocks = int(row["blocks"])
+        parsing_duration_ms = float(row["parsing_duration_ms"])
+
+        # Update statistics
+        stats["total_documents"] += 1
+        stats["total_pages"] += n_pages
+        stats["total_blocks"] += n_blocks
+        stats["parsing_durations_ms"].append(parsing_duration_ms)
+        stats["blocks_per_doc"].append(n_blocks)
+        stats["pages_per_doc"].append(n_pages)
+        stats["blocks_per_page"].append(n_blocks / n_pages if n_pages > 0 else 0)
 
     # Calculate aggregate statistics
     if stats["total_documents"] > 0:
+        durations_ms = np.asarray(stats["parsing_durations_ms"])
+        p50, p95, p99 = np.percentile(durations_ms, [50, 95, 99])
         results = {
             "Total Documents Processed": stats["total_documents"],
             "Total Pages Processed": stats["total_pages"],
             "Total Blocks Extracted": stats["total_blocks"],
-            "Average Pages per Document": statistics.mean(stats["pages_per_doc"]),
-            "Average Blocks per Document": statistics.mean(stats["blocks_per_doc"]),
-            "Average Blocks per Page": statistics.mean(stats["blocks_per_page"]),
-            "Average Processing Time": f"{statistics.mean(stats['parsing_durations_ms']):.2f}ms",
-            "Median Processing Time": f"{statistics.median(stats['parsing_durations_ms']):.2f}ms",
+            "Average Pages per Document": np.mean(stats["pages_per_doc"]),
+            "Average Blocks per Document": np.mean(stats["blocks_per_doc"]),
+            "Average Blocks per Page": np.mean(stats["blocks_per_page"]),
+            "Average Processing Time": f"{durations_ms.mean():.2f}ms",
+            "Median Processing Time": f"{p50:.2f}ms",
+            "P95 Processing Time": f"{p95:.2f}ms",
+            "P99 Processing Time": f"{p99:.2f}ms",
             "Pages per Second": stats["total_pages"] / processing_time_s,
-            "Min Processing Time": f"{min(stats['parsing_durations_ms']):.2f}ms",
-            "Max Processing Time": f"{max(stats['parsing_durations_ms']):.2f}ms",
+            "Min Processing Time": f"{durations_ms.min():.2f}ms",
+            "Max Processing Time": f"{durations_ms.max():.2f}ms",
         }
 
         # Print results in a formatted way
@@ -90,6 +92,26 @@ def analyze_parsing_results(
         return None
 
 
+def summarize_response(filename, content):
+    """Reduce a parse response to the per-file numbers the analysis needs."""
+    summary = {"filename": filename, "success": False}
+    if content is None:
+        return summary
+    try:
+        response = orjson.loads(content)
+        if response.get("success"):
+            doc = response["data"]
+            summary.update(
+                success=True,
+                pages=len(doc["pages"]),
+                blocks=len(doc["blocks"]),
+                parsing_duration_ms=doc["metadata"]["parsing_duration"],
+            )
+    except Exception as e:
+        logger.error(f"Error summarizing {filename}: {e}")
+    return summary
+
+
 async def process_file(session, file_path, sem):
     """Process a single file using aiohttp with semaphore control."""
     filename = os.path.basename(file_path)
@@ -117,11 +139,31 @@ async def process_file(session, file_path, sem):
             return filename, None
 
 
+async def warm_up(file_path):
+    """Parse one file untimed so first-inference model setup isn't measured."""
+    async with aiohttp.ClientSession() as session:
+        await process_file(session, str(file_path), Semaphore(1))
+
+
 async def process_directory(
-    input_dir, max_concurrent=4, output_dir="/tmp/pdf_responses", limit=None
+    input_dir,
+    max_concurrent=4,
+    output_dir="/tmp/pdf_responses",
+    limit=None,
+    dump_responses=False,
 ):
+    """Process all PDF files in the directory with concurrency limit.
+
+    Returns whether any file was sent, results from a previous run are
+    always cleared first so they can't be mistaken for this one.
+    """
     sem = Semaphore(max_concurrent)
-    """Process all PDF files in the directory with concurrency limit."""
+    # Create temporary directory for responses
+    output_dir = Path(output_dir)
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
     input_path = Path(input_dir)
     pdf_files = list(input_path.glob("*.pdf"))
     if limit is not None:
@@ -129,13 +171,8 @@ async def process_directory(
 
     if not pdf_files:
         logger.warning(f"No PDF files found in {input_dir}")
-        return
+        return False
 
-    # Create temporary directory for responses
-    output_dir = Path(output_dir)
-    if output_dir.exists():
-        shutil.rmtree(output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
     logger.info(f"Storing responses in: {output_dir}")
 
     # Configure connection pooling
@@ -143,15 +180,22 @@ async def process_directory(
         # Create tasks for all files, passing the semaphore
         tasks = [process_file(session, str(pdf), sem) for pdf in pdf_files]
 
-        # Process files and gather results
-        results = await asyncio.gather(*tasks)
+        with open(output_dir / RESULTS_CSV, "w", newline="") as results_file:
+            # Only the per-file numbers are kept, full responses are opt-in
+            results_writer = csv.DictWriter(results_file, fieldnames=RESULTS_FIELDS)
+            results_writer.writeheader()
+
+            # Save each result as soon as it arrives instead of holding every
+            # response body in memory until the last file is done
+            for task in asyncio.as_completed(tasks):
+                filename, content = await task
+                results_writer.writerow(summarize_response(filename, content))
+                if content and dump_responses:
+                    output_file = output_dir / f"{filename}.json"
+                    with open(output_file, "w") as f:
+                        f.write(content)
 
-        # Save results
-        for filename, content in results:
-            if content:
-                output_file = output_dir / f"{filename}.json"
-                with open(output_file, "w") as f:
-                    f.write(content)
+    return True
 
 
 def main():
@@ -168,6 +212,16 @@ def main():
         type=int,
         help="Limit the number of PDF files to process (default: process all files)",
     )
+    parser.add_argument(
+        "--dump-responses",
+        action="store_true",
+        help="Also save each full JSON response next to the results summary",
+    )
+    parser.add_argument(
+        "--no-warmup",
+        action="store_true",
+        help="Skip the untimed warm-up request sent before the benchmark",
+    )
     # Parse arguments
     args = parser.parse_args()
 
@@ -176,14 +230,28 @@ def main():
         logger.error(f"Input directory '{args.input_dir}' does not exist")
         return
 
+    # The server builds its ORT sessions and autotunes kernels on the first
+    # inference, keep that one-off cost out of the measured run
+    warmup_file = next(Path(args.input_dir).glob("*.pdf"), None)
+    if warmup_file is not None and not args.no_warmup:
+        asyncio.run(warm_up(warmup_file))
+
     # Run the async process
     s = perf_counter()
-    asyncio.run(
-        process_directory(args.input_dir, args.max_concurrent, limit=args.limit)
+    processed = asyncio.run(
+        process_directory(
+            args.input_dir,
+            args.max_concurrent,
+            limit=args.limit,
+            dump_responses=args.dump_responses,
+        )
     )
     logger.info("All files processed.")
     e = perf_counter()
-    analyze_parsing_results(e - s)
+    if processed:
+        analyze_parsing_results(e - s)
+    else:
+        print("No valid documents found to analyze")
 
 
 if __name__ == "__main__":